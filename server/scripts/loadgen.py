@@ -0,0 +1,102 @@
+"""
+Load generator for the tracking pixel endpoint.
+
+Registers a pool of tracked emails, then hammers /p/<id>.gif at a target rate
+and reports throughput and latency. Profile the server while it runs, e.g.
+
+    py-spy record --rate 1000 -o profile.svg -- gunicorn server:app ...
+    python scripts/loadgen.py --base-url http://127.0.0.1:8000 --rps 1000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def create_emails(base_url, count):
+    ids = []
+    for i in range(count):
+        req = urllib.request.Request(
+            f"{base_url}/api/track",
+            data=json.dumps({"recipient": f"load{i}@example.com", "subject": f"Load test {i}"}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req) as res:
+            ids.append(json.load(res)["email_id"])
+    return ids
+
+
+def hit_pixel(url, scheduled):
+    # Latency is measured from the scheduled send time, so time spent waiting
+    # for a free slot counts when the server falls behind.
+    try:
+        with urllib.request.urlopen(url) as res:
+            res.read()
+            ok = res.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - scheduled, ok
+
+
+def run(base_url, email_ids, rps, duration, concurrency):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def record(future):
+        nonlocal errors
+        slots.release()
+        elapsed, ok = future.result()
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    interval = 1.0 / rps
+    start = time.perf_counter()
+    sent = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while time.perf_counter() - start < duration:
+            scheduled = start + sent * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            url = f"{base_url}/p/{random.choice(email_ids)}.gif"
+            slots.acquire()
+            pool.submit(hit_pixel, url, scheduled).add_done_callback(record)
+            sent += 1
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--emails", type=int, default=100, help="number of tracked emails to spread hits over")
+    parser.add_argument("--rps", type=float, default=1000, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--concurrency", type=int, default=64, help="max in-flight requests")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    email_ids = create_emails(base_url, args.emails)
+    print(f"Created {len(email_ids)} tracked emails, sending ~{args.rps:.0f} req/s for {args.duration:.0f}s")
+
+    latencies, errors, elapsed = run(base_url, email_ids, args.rps, args.duration, args.concurrency)
+    if not latencies:
+        print("No requests completed")
+        return
+    latencies.sort()
+    ms = [l * 1000 for l in latencies]
+    print(f"Requests: {len(ms)}  errors: {errors}  achieved: {len(ms) / elapsed:.0f} req/s")
+    print(f"Latency ms  mean {statistics.mean(ms):.2f}  p50 {ms[len(ms) // 2]:.2f}  "
+          f"p95 {ms[int(len(ms) * 0.95)]:.2f}  p99 {ms[int(len(ms) * 0.99)]:.2f}  max {ms[-1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
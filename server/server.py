@@ -6,17 +6,22 @@ Deploy to Render.com (free tier)
 import os
 import json
 import re
+import queue
 import threading
 import time
 import base64
+import secrets
+import atexit
 import logging
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 from urllib.parse import quote, unquote, urlparse
 
-from flask import Flask, request, send_file, jsonify, render_template_string, redirect, abort
+from flask import Flask, request, jsonify, redirect, abort
+from werkzeug.middleware.proxy_fix import ProxyFix
 import sqlite3
-import uuid
-import io
 
 try:
     from google.oauth2.credentials import Credentials
@@ -31,7 +36,10 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", uuid.uuid4().hex)
+# Render puts one proxy in front of the app; trust its X-Forwarded-For entry
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+app.secret_key = os.environ.get("SECRET_KEY", secrets.token_hex(16))
+app.config["MAX_CONTENT_LENGTH"] = 64 * 1024
 
 
 @app.after_request
@@ -53,18 +61,66 @@ SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 PIXEL = base64.b64decode(
     "R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
 )
+PIXEL_HEADERS = {
+    "Content-Type": "image/gif",
+    "Content-Length": str(len(PIXEL)),
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+HTML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;",
+})
 
 LAST_PROCESSED_FILE = os.path.join(DATA_DIR, "last_processed.txt")
 
 
+PAGE_SIZE = 8192
+READ_POOL_SIZE = 8
+EVENT_BATCH_SIZE = 200
+EVENT_FLUSH_INTERVAL = 0.25
+OPTIMIZE_INTERVAL = 4 * 60 * 60
+READ_OPTIMIZE_EVERY = 1000
+SHUTDOWN_TIMEOUT = 10
+DETAIL_PAGE_SIZE = 100
+DETAIL_MAX_PAGE_SIZE = 500
+
+STATEMENT_CACHE_SIZE = 256
+
+# Hot-path statements, kept as constants so every call reuses the same
+# prepared statement from the connection's statement cache.
+SQL_EMAIL_EXISTS = "SELECT 1 FROM emails WHERE id = ?"
+SQL_LINK_INFO = "SELECT email_id, original_url FROM links WHERE id = ?"
+SQL_INSERT_OPEN = "INSERT INTO opens (email_id, ip_address, user_agent, method) SELECT id, ?, ?, ? FROM emails WHERE id = ?"
+SQL_INSERT_CLICK = "INSERT INTO clicks (link_id, email_id, ip_address, user_agent) SELECT id, email_id, ?, ? FROM links WHERE id = ?"
+SQL_BUMP_OPENS = "UPDATE emails SET open_count = open_count + ?, last_opened = CURRENT_TIMESTAMP WHERE id = ?"
+SQL_BUMP_CLICKS = "UPDATE emails SET click_count = click_count + ?, last_clicked = CURRENT_TIMESTAMP WHERE id = ?"
+
+# Connections, lookup caches and the event queue live in this process, so the
+# app is meant to run as a single gunicorn worker with threads (see render.yaml).
+_write_conn = None
+_write_lock = threading.Lock()
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+_event_queue = queue.Queue()
+STOP_EVENTS = object()
+
+
 def get_db():
-    db = sqlite3.connect(DATABASE)
+    db = sqlite3.connect(DATABASE, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     db.row_factory = sqlite3.Row
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA cache_size=-16000")
+    db.execute("PRAGMA mmap_size=268435456")
+    db.execute("PRAGMA temp_store=MEMORY")
+    db.execute("PRAGMA busy_timeout=5000")
+    db.execute("PRAGMA wal_autocheckpoint=1000")
+    db.execute("PRAGMA journal_size_limit=67108864")
+    db.execute("PRAGMA foreign_keys=ON")
     return db
 
 
-def init_db():
-    db = get_db()
+def create_tables(db):
     db.execute("""
         CREATE TABLE IF NOT EXISTS emails (
             id TEXT PRIMARY KEY,
@@ -72,7 +128,11 @@ def init_db():
             subject TEXT NOT NULL,
             gmail_msg_id TEXT,
             auto_tracked INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            open_count INTEGER DEFAULT 0,
+            last_opened TIMESTAMP,
+            click_count INTEGER DEFAULT 0,
+            last_clicked TIMESTAMP
         )
     """)
     db.execute("""
@@ -83,7 +143,7 @@ def init_db():
             ip_address TEXT,
             user_agent TEXT,
             method TEXT DEFAULT 'pixel',
-            FOREIGN KEY (email_id) REFERENCES emails(id)
+            FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE
         )
     """)
     db.execute("""
@@ -93,7 +153,7 @@ def init_db():
             original_url TEXT NOT NULL,
             label TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (email_id) REFERENCES emails(id)
+            FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE
         )
     """)
     db.execute("""
@@ -104,13 +164,176 @@ def init_db():
             clicked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             ip_address TEXT,
             user_agent TEXT,
-            FOREIGN KEY (link_id) REFERENCES links(id),
-            FOREIGN KEY (email_id) REFERENCES emails(id)
+            FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE,
+            FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE
         )
     """)
+
+
+def init_db():
+    db = get_db()
+    migrate_page_size(db)
+    # journal_mode is persistent in the db file, so it only needs setting once
+    db.execute("PRAGMA journal_mode=WAL")
+    create_tables(db)
+    migrate_cascade_deletes(db)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_opens_email ON opens(email_id, opened_at DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_clicks_email ON clicks(email_id, clicked_at DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_links_email ON links(email_id, created_at)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_emails_gmail_msg ON emails(gmail_msg_id)")
+    db.execute("""
+        CREATE TRIGGER IF NOT EXISTS clicks_to_opens AFTER INSERT ON clicks BEGIN
+            INSERT INTO opens (email_id, ip_address, user_agent, method)
+            VALUES (NEW.email_id, NEW.ip_address, NEW.user_agent, 'link');
+        END
+    """)
+    migrate_email_counters(db)
     db.commit()
     db.close()
 
+    global _write_conn
+    if _write_conn is None:
+        _write_conn = get_db()
+
+
+def migrate_page_size(db):
+    if db.execute("PRAGMA page_size").fetchone()[0] == PAGE_SIZE:
+        return
+    if db.execute("PRAGMA page_count").fetchone()[0] == 0:
+        db.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        return
+    # The page size of an existing database can only change through VACUUM,
+    # and not while it is in WAL mode.
+    logger.info(f"Rebuilding database with {PAGE_SIZE}-byte pages")
+    try:
+        db.execute("PRAGMA journal_mode=DELETE")
+        db.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        db.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        logger.error(f"Could not change page size: {e}")
+
+
+def migrate_cascade_deletes(db):
+    fks = db.execute("PRAGMA foreign_key_list(opens)").fetchall()
+    if all(fk["on_delete"] == "CASCADE" for fk in fks):
+        return
+    # Tables created before ON DELETE CASCADE was added have to be rebuilt;
+    # rows whose parent no longer exists are dropped along the way.
+    logger.info("Rebuilding opens/links/clicks with ON DELETE CASCADE")
+    db.commit()
+    # foreign_keys cannot be changed inside a transaction. The explicit BEGIN
+    # is needed because sqlite3 would otherwise autocommit each DDL statement,
+    # and an interrupted rebuild would leave the data stranded in *_old.
+    db.execute("PRAGMA foreign_keys=OFF")
+    try:
+        db.execute("BEGIN")
+        for table in ("opens", "links", "clicks"):
+            db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        create_tables(db)
+        db.execute("INSERT INTO opens SELECT * FROM opens_old WHERE email_id IN (SELECT id FROM emails)")
+        db.execute("INSERT INTO links SELECT * FROM links_old WHERE email_id IN (SELECT id FROM emails)")
+        db.execute("INSERT INTO clicks SELECT * FROM clicks_old WHERE link_id IN (SELECT id FROM links)")
+        for table in ("clicks", "links", "opens"):
+            db.execute(f"DROP TABLE {table}_old")
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.execute("PRAGMA foreign_keys=ON")
+
+
+def migrate_email_counters(db):
+    columns = {row["name"] for row in db.execute("PRAGMA table_info(emails)")}
+    if "open_count" in columns:
+        return
+    logger.info("Adding open/click counters to emails table")
+    # Explicit transaction so the columns are never committed without the backfill.
+    db.commit()
+    try:
+        db.execute("BEGIN")
+        db.execute("ALTER TABLE emails ADD COLUMN open_count INTEGER DEFAULT 0")
+        db.execute("ALTER TABLE emails ADD COLUMN last_opened TIMESTAMP")
+        db.execute("ALTER TABLE emails ADD COLUMN click_count INTEGER DEFAULT 0")
+        db.execute("ALTER TABLE emails ADD COLUMN last_clicked TIMESTAMP")
+        db.execute("""
+            UPDATE emails SET
+                open_count = (SELECT COUNT(*) FROM opens WHERE email_id = emails.id),
+                last_opened = (SELECT MAX(opened_at) FROM opens WHERE email_id = emails.id),
+                click_count = (SELECT COUNT(*) FROM clicks WHERE email_id = emails.id),
+                last_clicked = (SELECT MAX(clicked_at) FROM clicks WHERE email_id = emails.id)
+        """)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+# PRAGMA optimize only considers tables the same connection has queried, so
+# the pooled read connections (which run the list/detail queries) each run it
+# themselves every READ_OPTIMIZE_EVERY checkouts.
+@contextmanager
+def db_read():
+    try:
+        db, uses = _read_pool.get_nowait()
+    except queue.Empty:
+        db, uses = get_db(), 0
+    try:
+        yield db
+    finally:
+        uses += 1
+        if uses >= READ_OPTIMIZE_EVERY:
+            optimize_conn(db)
+            uses = 0
+        try:
+            _read_pool.put_nowait((db, uses))
+        except queue.Full:
+            db.close()
+
+
+@contextmanager
+def db_write():
+    with _write_lock:
+        try:
+            yield _write_conn
+            _write_conn.commit()
+        except BaseException:
+            _write_conn.rollback()
+            raise
+
+
+def optimize_conn(db):
+    try:
+        db.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logger.error(f"PRAGMA optimize failed: {e}")
+
+
+def optimize_db():
+    with db_write() as db:
+        optimize_conn(db)
+    idle = []
+    while True:
+        try:
+            idle.append(_read_pool.get_nowait())
+        except queue.Empty:
+            break
+    for db, _ in idle:
+        optimize_conn(db)
+        try:
+            _read_pool.put_nowait((db, 0))
+        except queue.Full:
+            db.close()
+
+
+def optimize_loop():
+    while True:
+        time.sleep(OPTIMIZE_INTERVAL)
+        try:
+            optimize_db()
+        except Exception as e:
+            logger.error(f"PRAGMA optimize failed: {e}")
+
 
 def get_base_url():
     return os.environ.get("BASE_URL", "https://email-tracker-941n.onrender.com").rstrip("/")
@@ -212,24 +435,22 @@ def process_new_sent_emails():
                 to_addr = headers.get("to", "unknown")
                 subject = headers.get("subject", "(no subject)")
 
-                db = get_db()
-                existing = db.execute(
-                    "SELECT * FROM emails WHERE gmail_msg_id = ?", (msg_id,)
-                ).fetchone()
-                db.close()
+                with db_read() as db:
+                    existing = db.execute(
+                        "SELECT 1 FROM emails WHERE gmail_msg_id = ?", (msg_id,)
+                    ).fetchone()
 
                 if existing:
                     new_last_id = msg_id
                     continue
 
-                email_id = uuid.uuid4().hex[:12]
-                db = get_db()
-                db.execute(
-                    "INSERT INTO emails (id, recipient, subject, gmail_msg_id, auto_tracked) VALUES (?, ?, ?, ?, 1)",
-                    (email_id, to_addr, subject, msg_id),
-                )
-                db.commit()
-                db.close()
+                email_id = secrets.token_urlsafe(9)
+                with db_write() as db:
+                    db.execute(
+                        "INSERT INTO emails (id, recipient, subject, gmail_msg_id, auto_tracked) VALUES (?, ?, ?, ?, 1)",
+                        (email_id, to_addr, subject, msg_id),
+                    )
+                invalidate_lookup_caches()
 
                 logger.info(f"Registered sent email: {subject} -> {to_addr}")
                 new_last_id = msg_id
@@ -257,51 +478,121 @@ def gmail_monitor_loop():
         time.sleep(60)
 
 
+# ─── EVENT WRITER ─────────────────────────────────────────────────────
+# Opens and clicks are queued by the tracking endpoints and written in
+# batches by a background thread, one transaction per batch.
+
+def flush_events(batch):
+    opens, clicks = [], []
+    for event in batch:
+        if event[0] == "open":
+            opens.append(event[1:])
+        else:
+            clicks.append(event[1:])
+    click_counts = Counter(c[1] for c in clicks)
+    # A click also counts as an open; its opens row is written by the
+    # clicks_to_opens trigger.
+    open_counts = Counter(o[0] for o in opens) + click_counts
+    # The INSERT ... SELECT form skips events whose email or link was deleted
+    # after they were queued, which would otherwise fail the foreign key check.
+    with db_write() as db:
+        if clicks:
+            db.executemany(SQL_INSERT_CLICK, [(ip, ua, link_id) for link_id, _, ip, ua in clicks])
+            db.executemany(SQL_BUMP_CLICKS, [(n, email_id) for email_id, n in click_counts.items()])
+        if opens:
+            db.executemany(SQL_INSERT_OPEN, [(ip, ua, method, email_id) for email_id, ip, ua, method in opens])
+        if open_counts:
+            db.executemany(SQL_BUMP_OPENS, [(n, email_id) for email_id, n in open_counts.items()])
+
+
+def drain_events(batch, timeout):
+    # Returns True once the stop sentinel has been taken off the queue.
+    deadline = time.monotonic() + timeout
+    while len(batch) < EVENT_BATCH_SIZE:
+        try:
+            event = _event_queue.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        if event is STOP_EVENTS:
+            return True
+        batch.append(event)
+    return False
+
+
+def write_events(batch):
+    try:
+        flush_events(batch)
+    except Exception as e:
+        logger.error(f"Error writing {len(batch)} tracking events: {e}")
+
+
+def event_flush_loop():
+    stopped = False
+    while not stopped:
+        first = _event_queue.get()
+        if first is STOP_EVENTS:
+            break
+        batch = [first]
+        stopped = drain_events(batch, EVENT_FLUSH_INTERVAL)
+        write_events(batch)
+    # Write out anything queued behind the sentinel before exiting.
+    while True:
+        batch = []
+        drain_events(batch, 0)
+        if not batch:
+            break
+        write_events(batch)
+
+
+@atexit.register
+def shutdown_db():
+    _event_queue.put(STOP_EVENTS)
+    flusher_thread.join(timeout=SHUTDOWN_TIMEOUT)
+    try:
+        optimize_db()
+    except Exception as e:
+        logger.error(f"PRAGMA optimize failed: {e}")
+
+
 # ─── TRACKING ENDPOINTS ───────────────────────────────────────────────
+# Existence lookups are cached per process; anything that creates or deletes
+# emails/links must call invalidate_lookup_caches().
+
+@lru_cache(maxsize=4096)
+def email_exists(email_id):
+    with db_read() as db:
+        return db.execute(SQL_EMAIL_EXISTS, (email_id,)).fetchone() is not None
+
+
+@lru_cache(maxsize=4096)
+def link_info(link_id):
+    with db_read() as db:
+        link = db.execute(SQL_LINK_INFO, (link_id,)).fetchone()
+    return (link["email_id"], link["original_url"]) if link else None
+
+
+def invalidate_lookup_caches():
+    email_exists.cache_clear()
+    link_info.cache_clear()
+
 
 @app.route("/p/<email_id>.gif")
 def track_open(email_id):
-    db = get_db()
-    email = db.execute("SELECT * FROM emails WHERE id = ?", (email_id,)).fetchone()
-    if email:
-        db.execute(
-            "INSERT INTO opens (email_id, ip_address, user_agent, method) VALUES (?, ?, ?, ?)",
-            (email_id, request.headers.get("X-Forwarded-For", request.remote_addr),
-             request.headers.get("User-Agent", ""), "pixel"),
-        )
-        db.commit()
-    db.close()
-
-    return send_file(
-        io.BytesIO(PIXEL), mimetype="image/gif",
-        headers={"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-                 "Pragma": "no-cache", "Expires": "0"},
-    )
+    if email_exists(email_id):
+        _event_queue.put(("open", email_id, request.remote_addr,
+                          request.headers.get("User-Agent", ""), "pixel"))
+    return PIXEL, 200, PIXEL_HEADERS
 
 
 @app.route("/l/<link_id>")
 def track_click(link_id):
-    db = get_db()
-    link = db.execute("SELECT * FROM links WHERE id = ?", (link_id,)).fetchone()
+    link = link_info(link_id)
     if not link:
-        db.close()
         abort(404)
 
-    db.execute(
-        "INSERT INTO clicks (link_id, email_id, ip_address, user_agent) VALUES (?, ?, ?, ?)",
-        (link_id, link["email_id"],
-         request.headers.get("X-Forwarded-For", request.remote_addr),
-         request.headers.get("User-Agent", "")),
-    )
-    db.execute(
-        "INSERT INTO opens (email_id, ip_address, user_agent, method) VALUES (?, ?, ?, ?)",
-        (link["email_id"],
-         request.headers.get("X-Forwarded-For", request.remote_addr),
-         request.headers.get("User-Agent", ""), "link"),
-    )
-    db.commit()
-    original_url = link["original_url"]
-    db.close()
+    email_id, original_url = link
+    _event_queue.put(("click", link_id, email_id, request.remote_addr,
+                      request.headers.get("User-Agent", "")))
     return redirect(original_url)
 
 
@@ -355,53 +646,52 @@ def gmail_disconnect():
 
 @app.route("/api/track", methods=["POST"])
 def create_tracked_email():
-    data = request.json
+    data = request.get_json(silent=True, cache=False) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "bad json"}), 400
     recipient = data.get("recipient", "")
     subject = data.get("subject", "")
     if not recipient or not subject:
         return jsonify({"error": "recipient and subject are required"}), 400
-    email_id = uuid.uuid4().hex[:12]
-    db = get_db()
-    db.execute("INSERT INTO emails (id, recipient, subject) VALUES (?, ?, ?)", (email_id, recipient, subject))
-    db.commit()
-    db.close()
+    email_id = secrets.token_urlsafe(9)
+    with db_write() as db:
+        db.execute("INSERT INTO emails (id, recipient, subject) VALUES (?, ?, ?)", (email_id, recipient, subject))
+    invalidate_lookup_caches()
     base_url = request.host_url.rstrip("/")
     pixel_url = f"{base_url}/p/{email_id}.gif"
-    img_tag = f'<img src="{pixel_url}" width="1" height="1" style="display:none" alt="" />'
+    img_tag = f'<img src="{pixel_url.translate(HTML_ESCAPE_TABLE)}" width="1" height="1" style="display:none" alt="" />'
     return jsonify({"email_id": email_id, "pixel_url": pixel_url, "img_tag": img_tag})
 
 
 @app.route("/api/link", methods=["POST"])
 def create_tracked_link():
-    data = request.json
+    data = request.get_json(silent=True, cache=False) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "bad json"}), 400
     email_id = data.get("email_id", "")
     original_url = data.get("url", "")
     label = data.get("label", "")
     if not email_id or not original_url:
         return jsonify({"error": "email_id and url are required"}), 400
-    link_id = uuid.uuid4().hex[:10]
-    db = get_db()
-    email = db.execute("SELECT * FROM emails WHERE id = ?", (email_id,)).fetchone()
-    if not email:
-        db.close()
-        return jsonify({"error": "email not found"}), 404
-    db.execute("INSERT INTO links (id, email_id, original_url, label) VALUES (?, ?, ?, ?)", (link_id, email_id, original_url, label))
-    db.commit()
-    db.close()
+    link_id = secrets.token_urlsafe(8)
+    with db_write() as db:
+        email = db.execute(SQL_EMAIL_EXISTS, (email_id,)).fetchone()
+        if not email:
+            return jsonify({"error": "email not found"}), 404
+        db.execute("INSERT INTO links (id, email_id, original_url, label) VALUES (?, ?, ?, ?)", (link_id, email_id, original_url, label))
+    invalidate_lookup_caches()
     base_url = request.host_url.rstrip("/")
     return jsonify({"link_id": link_id, "tracked_url": f"{base_url}/l/{link_id}", "original_url": original_url})
 
 
 @app.route("/api/emails")
 def list_emails():
-    db = get_db()
-    emails = db.execute("""
-        SELECT e.*, COUNT(DISTINCT o.id) as open_count, MAX(o.opened_at) as last_opened,
-               COUNT(DISTINCT c.id) as click_count, MAX(c.clicked_at) as last_clicked
-        FROM emails e LEFT JOIN opens o ON e.id = o.email_id
-        LEFT JOIN clicks c ON e.id = c.email_id GROUP BY e.id ORDER BY e.created_at DESC
-    """).fetchall()
-    db.close()
+    with db_read() as db:
+        emails = db.execute("""
+            SELECT id, recipient, subject, created_at, auto_tracked,
+                   open_count, last_opened, click_count, last_clicked
+            FROM emails ORDER BY created_at DESC
+        """).fetchall()
     return jsonify([{
         "id": e["id"], "recipient": e["recipient"], "subject": e["subject"],
         "created_at": e["created_at"], "open_count": e["open_count"],
@@ -410,38 +700,58 @@ def list_emails():
     } for e in emails])
 
 
+@app.route("/api/stats")
+def get_stats():
+    with db_read() as db:
+        stats = db.execute("""
+            SELECT COUNT(*) as total_emails, COALESCE(SUM(open_count), 0) as total_opens,
+                   COALESCE(SUM(click_count), 0) as total_clicks,
+                   COALESCE(SUM(open_count > 0 OR click_count > 0), 0) as engaged
+            FROM emails
+        """).fetchone()
+    return jsonify(dict(stats))
+
+
 @app.route("/api/emails/<email_id>")
 def get_email_detail(email_id):
-    db = get_db()
-    opens = db.execute("SELECT * FROM opens WHERE email_id = ? ORDER BY opened_at DESC", (email_id,)).fetchall()
-    links = db.execute("SELECT * FROM links WHERE email_id = ? ORDER BY created_at", (email_id,)).fetchall()
-    clicks = db.execute(
-        "SELECT c.*, l.original_url, l.label FROM clicks c JOIN links l ON c.link_id = l.id WHERE c.email_id = ? ORDER BY c.clicked_at DESC",
-        (email_id,)).fetchall()
-    db.close()
-    return jsonify({
-        "opens": [{"opened_at": o["opened_at"], "ip_address": o["ip_address"], "user_agent": o["user_agent"], "method": o["method"]} for o in opens],
-        "links": [{"id": l["id"], "original_url": l["original_url"], "label": l["label"]} for l in links],
-        "clicks": [{"clicked_at": c["clicked_at"], "ip_address": c["ip_address"], "original_url": c["original_url"], "label": c["label"]} for c in clicks],
-    })
+    # Opens and clicks are paged newest first. The next page of one list is
+    # requested with ?only=opens|clicks&before=<timestamp>&before_id=<id>
+    # taken from the last entry already shown.
+    limit = min(max(request.args.get("limit", DETAIL_PAGE_SIZE, type=int), 1), DETAIL_MAX_PAGE_SIZE)
+    only = request.args.get("only")
+    cursor = (request.args.get("before", "9999-12-31"), request.args.get("before_id", 2 ** 63 - 1, type=int))
+    result = {}
+    with db_read() as db:
+        if only != "clicks":
+            opens = db.execute(
+                "SELECT id, opened_at, ip_address, user_agent, method FROM opens WHERE email_id = ? AND (opened_at, id) < (?, ?) ORDER BY opened_at DESC, id DESC LIMIT ?",
+                (email_id, *cursor, limit + 1)).fetchall()
+            result["opens"] = [{"id": o["id"], "opened_at": o["opened_at"], "ip_address": o["ip_address"], "user_agent": o["user_agent"], "method": o["method"]} for o in opens[:limit]]
+            result["more_opens"] = len(opens) > limit
+        if only is None:
+            links = db.execute("SELECT id, original_url, label FROM links WHERE email_id = ? ORDER BY created_at", (email_id,)).fetchall()
+            result["links"] = [{"id": l["id"], "original_url": l["original_url"], "label": l["label"]} for l in links]
+        if only != "opens":
+            clicks = db.execute(
+                "SELECT c.id, c.clicked_at, c.ip_address, l.original_url, l.label FROM clicks c JOIN links l ON c.link_id = l.id WHERE c.email_id = ? AND (c.clicked_at, c.id) < (?, ?) ORDER BY c.clicked_at DESC, c.id DESC LIMIT ?",
+                (email_id, *cursor, limit + 1)).fetchall()
+            result["clicks"] = [{"id": c["id"], "clicked_at": c["clicked_at"], "ip_address": c["ip_address"], "original_url": c["original_url"], "label": c["label"]} for c in clicks[:limit]]
+            result["more_clicks"] = len(clicks) > limit
+    return jsonify(result)
 
 
 @app.route("/api/emails/<email_id>", methods=["DELETE"])
 def delete_email(email_id):
-    db = get_db()
-    db.execute("DELETE FROM clicks WHERE email_id = ?", (email_id,))
-    db.execute("DELETE FROM opens WHERE email_id = ?", (email_id,))
-    db.execute("DELETE FROM links WHERE email_id = ?", (email_id,))
-    db.execute("DELETE FROM emails WHERE id = ?", (email_id,))
-    db.commit()
-    db.close()
+    with db_write() as db:
+        db.execute("DELETE FROM emails WHERE id = ?", (email_id,))
+    invalidate_lookup_caches()
     return jsonify({"success": True})
 
 
 # ─── DASHBOARD ─────────────────────────────────────────────────────────
 @app.route("/")
 def dashboard():
-    return render_template_string(DASHBOARD_HTML)
+    return DASHBOARD_BYTES, 200, DASHBOARD_HEADERS
 
 
 DASHBOARD_HTML = r"""
@@ -583,7 +893,7 @@ DASHBOARD_HTML = r"""
   <div class="email-list"><h2>Tracked Emails</h2><div id="emailList"><div class="empty-state"><p>No emails tracked yet.</p></div></div></div>
 </div>
 <div class="modal-overlay" id="modalOverlay" onclick="closeModal(event)">
-  <div class="modal" onclick="event.stopPropagation()">
+  <div class="modal" onclick="event.stopPropagation()" onscroll="detailScroll(this)">
     <h3 id="modalTitle"></h3><div class="modal-sub" id="modalSub"></div>
     <div class="tab-bar"><div class="tab active" onclick="switchTab('opens',this)">Opens</div><div class="tab" onclick="switchTab('clicks',this)">Clicks</div></div>
     <div class="tab-content active" id="tab-opens"></div><div class="tab-content" id="tab-clicks"></div>
@@ -591,24 +901,45 @@ DASHBOARD_HTML = r"""
 </div>
 <script>
 let currentEmailId='';
-async function checkGmail(){try{const r=await fetch('/gmail/status');const d=await r.json();const dot=document.getElementById('gmailDot'),s=document.getElementById('gmailStatus'),b=document.getElementById('gmailBtn'),bn=document.getElementById('gmailBanner');if(d.connected){dot.className='gmail-dot on';s.innerHTML='Gmail connected: <span class="email">'+d.email+'</span> — auto-tracking';b.textContent='Disconnect';b.className='gmail-btn disconnect';b.onclick=()=>{location.href='/gmail/disconnect'};bn.classList.add('connected')}else{dot.className='gmail-dot off';s.textContent='Gmail not connected';b.textContent='Connect Gmail';b.className='gmail-btn connect';b.onclick=connectGmail}}catch(e){document.getElementById('gmailStatus').textContent='Gmail integration available'}}
+let detail={id:'',more:{},last:{},loading:false};
+async function checkGmail(){try{const r=await fetch('/gmail/status');const d=await r.json();const dot=document.getElementById('gmailDot'),s=document.getElementById('gmailStatus'),b=document.getElementById('gmailBtn'),bn=document.getElementById('gmailBanner');if(d.connected){dot.className='gmail-dot on';s.innerHTML='Gmail connected: <span class="email">'+esc(d.email)+'</span> — auto-tracking';b.textContent='Disconnect';b.className='gmail-btn disconnect';b.onclick=()=>{location.href='/gmail/disconnect'};bn.classList.add('connected')}else{dot.className='gmail-dot off';s.textContent='Gmail not connected';b.textContent='Connect Gmail';b.className='gmail-btn connect';b.onclick=connectGmail}}catch(e){document.getElementById('gmailStatus').textContent='Gmail integration available'}}
 function connectGmail(){location.href='/gmail/connect'}
-async function loadEmails(){const r=await fetch('/api/emails');const emails=await r.json();const t=emails.length,o=emails.reduce((s,e)=>s+e.open_count,0),c=emails.reduce((s,e)=>s+e.click_count,0),g=emails.filter(e=>e.open_count>0||e.click_count>0).length;document.getElementById('totalEmails').textContent=t;document.getElementById('totalOpens').textContent=o;document.getElementById('totalClicks').textContent=c;document.getElementById('openRate').textContent=t>0?Math.round(g/t*100)+'%':'0%';const l=document.getElementById('emailList');if(!emails.length){l.innerHTML='<div class="empty-state"><p>No emails tracked yet.</p></div>';return}l.innerHTML=emails.map(e=>{const ho=e.open_count>0,hc=e.click_count>0;const cr=new Date(e.created_at+'Z').toLocaleDateString('en-US',{month:'short',day:'numeric',hour:'2-digit',minute:'2-digit'});let b='';if(e.auto_tracked)b+='<div class="badge auto">AUTO</div>';if(ho)b+=`<div class="badge opened"><span class="dot"></span>${e.open_count} open${e.open_count>1?'s':''}</div>`;if(hc)b+=`<div class="badge clicked"><span class="dot"></span>${e.click_count} click${e.click_count>1?'s':''}</div>`;if(!ho&&!hc)b+='<div class="badge unopened"><span class="dot"></span>No activity</div>';return`<div class="email-card"><div class="email-info"><h3>${esc(e.subject)}</h3><div class="email-meta"><span>To: ${esc(e.recipient)}</span><span>${cr}</span></div></div><div class="email-actions">${b}${(ho||hc)?`<button class="btn btn-sm btn-ghost" onclick="viewDetail('${e.id}','${esc(e.subject)}','${esc(e.recipient)}')">Details</button>`:''}<button class="btn btn-sm btn-danger" onclick="deleteEmail('${e.id}')">×</button></div></div>`}).join('')}
+async function loadStats(){const r=await fetch('/api/stats');const d=await r.json();document.getElementById('totalEmails').textContent=d.total_emails;document.getElementById('totalOpens').textContent=d.total_opens;document.getElementById('totalClicks').textContent=d.total_clicks;document.getElementById('openRate').textContent=d.total_emails>0?Math.round(d.engaged/d.total_emails*100)+'%':'0%'}
+async function loadEmails(){const[,r]=await Promise.all([loadStats(),fetch('/api/emails')]);const emails=await r.json();const l=document.getElementById('emailList');if(!emails.length){l.innerHTML='<div class="empty-state"><p>No emails tracked yet.</p></div>';return}l.innerHTML=emails.map(e=>{const ho=e.open_count>0,hc=e.click_count>0;const cr=new Date(e.created_at+'Z').toLocaleDateString('en-US',{month:'short',day:'numeric',hour:'2-digit',minute:'2-digit'});let b='';if(e.auto_tracked)b+='<div class="badge auto">AUTO</div>';if(ho)b+=`<div class="badge opened"><span class="dot"></span>${e.open_count} open${e.open_count>1?'s':''}</div>`;if(hc)b+=`<div class="badge clicked"><span class="dot"></span>${e.click_count} click${e.click_count>1?'s':''}</div>`;if(!ho&&!hc)b+='<div class="badge unopened"><span class="dot"></span>No activity</div>';return`<div class="email-card"><div class="email-info"><h3>${esc(e.subject)}</h3><div class="email-meta"><span>To: ${esc(e.recipient)}</span><span>${cr}</span></div></div><div class="email-actions">${b}${(ho||hc)?`<button class="btn btn-sm btn-ghost" data-id="${esc(e.id)}" data-subject="${esc(e.subject)}" data-recipient="${esc(e.recipient)}" onclick="viewDetail(this.dataset.id,this.dataset.subject,this.dataset.recipient)">Details</button>`:''}<button class="btn btn-sm btn-danger" data-id="${esc(e.id)}" onclick="deleteEmail(this.dataset.id)">×</button></div></div>`}).join('')}
 async function createTracker(){const re=document.getElementById('recipient').value.trim(),su=document.getElementById('subject').value.trim();if(!re||!su)return;const r=await fetch('/api/track',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({recipient:re,subject:su})});const d=await r.json();currentEmailId=d.email_id;document.getElementById('pixelCode').textContent=d.img_tag;document.getElementById('pixelResult').classList.add('show');document.getElementById('linkSection').classList.add('show');document.getElementById('trackedLinks').innerHTML='';document.getElementById('recipient').value='';document.getElementById('subject').value='';loadEmails()}
-async function createLink(){const u=document.getElementById('linkUrl').value.trim(),lb=document.getElementById('linkLabel').value.trim();if(!u||!currentEmailId)return;const r=await fetch('/api/link',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({email_id:currentEmailId,url:u,label:lb})});const d=await r.json();document.getElementById('trackedLinks').innerHTML+=`<div class="tracked-link-item"><span class="label">${esc(lb||'Link')}</span><span class="url">${esc(d.tracked_url)}</span><button class="copy-small" onclick="navigator.clipboard.writeText('${d.tracked_url}');this.textContent='Done!';setTimeout(()=>this.textContent='Copy',1500)">Copy</button></div>`;document.getElementById('linkUrl').value='';document.getElementById('linkLabel').value=''}
-async function viewDetail(id,sub,rec){const r=await fetch(`/api/emails/${id}`);const d=await r.json();document.getElementById('modalTitle').textContent=sub;document.getElementById('modalSub').textContent='To: '+rec;document.getElementById('tab-opens').innerHTML=d.opens.length?d.opens.map(o=>`<div class="open-entry"><div class="open-time">${new Date(o.opened_at+'Z').toLocaleString()}<span class="method-tag ${o.method}">${o.method}</span></div><div class="open-details">IP: ${o.ip_address}<br>${o.user_agent}</div></div>`).join(''):'<p style="color:var(--text-dim);padding:20px 0">No opens yet.</p>';document.getElementById('tab-clicks').innerHTML=d.clicks.length?d.clicks.map(c=>`<div class="open-entry"><div class="open-time">${new Date(c.clicked_at+'Z').toLocaleString()}<span class="method-tag link">${esc(c.label||'link')}</span></div><div class="open-details">URL: ${esc(c.original_url)}<br>IP: ${c.ip_address}</div></div>`).join(''):'<p style="color:var(--text-dim);padding:20px 0">No clicks yet.</p>';document.querySelectorAll('.tab').forEach(t=>t.classList.remove('active'));document.querySelectorAll('.tab-content').forEach(t=>t.classList.remove('active'));document.querySelector('.tab').classList.add('active');document.getElementById('tab-opens').classList.add('active');document.getElementById('modalOverlay').classList.add('show')}
+async function createLink(){const u=document.getElementById('linkUrl').value.trim(),lb=document.getElementById('linkLabel').value.trim();if(!u||!currentEmailId)return;const r=await fetch('/api/link',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({email_id:currentEmailId,url:u,label:lb})});const d=await r.json();document.getElementById('trackedLinks').innerHTML+=`<div class="tracked-link-item"><span class="label">${esc(lb||'Link')}</span><span class="url">${esc(d.tracked_url)}</span><button class="copy-small" data-url="${esc(d.tracked_url)}" onclick="navigator.clipboard.writeText(this.dataset.url);this.textContent='Done!';setTimeout(()=>this.textContent='Copy',1500)">Copy</button></div>`;document.getElementById('linkUrl').value='';document.getElementById('linkLabel').value=''}
+function openHtml(o){return`<div class="open-entry"><div class="open-time">${new Date(o.opened_at+'Z').toLocaleString()}<span class="method-tag ${esc(o.method)}">${esc(o.method)}</span></div><div class="open-details">IP: ${esc(o.ip_address)}<br>${esc(o.user_agent)}</div></div>`}
+function clickHtml(c){return`<div class="open-entry"><div class="open-time">${new Date(c.clicked_at+'Z').toLocaleString()}<span class="method-tag link">${esc(c.label||'link')}</span></div><div class="open-details">URL: ${esc(c.original_url)}<br>IP: ${esc(c.ip_address)}</div></div>`}
+async function viewDetail(id,sub,rec){const r=await fetch(`/api/emails/${id}`);const d=await r.json();detail={id,more:{opens:d.more_opens,clicks:d.more_clicks},last:{opens:d.opens[d.opens.length-1],clicks:d.clicks[d.clicks.length-1]},loading:false};document.getElementById('modalTitle').textContent=sub;document.getElementById('modalSub').textContent='To: '+rec;document.getElementById('tab-opens').innerHTML=d.opens.length?d.opens.map(openHtml).join(''):'<p style="color:var(--text-dim);padding:20px 0">No opens yet.</p>';document.getElementById('tab-clicks').innerHTML=d.clicks.length?d.clicks.map(clickHtml).join(''):'<p style="color:var(--text-dim);padding:20px 0">No clicks yet.</p>';document.querySelectorAll('.tab').forEach(t=>t.classList.remove('active'));document.querySelectorAll('.tab-content').forEach(t=>t.classList.remove('active'));document.querySelector('.tab').classList.add('active');document.getElementById('tab-opens').classList.add('active');document.getElementById('modalOverlay').classList.add('show')}
+async function loadMore(n){if(detail.loading||!detail.more[n])return;detail.loading=true;try{const l=detail.last[n],id=detail.id;const r=await fetch(`/api/emails/${id}?only=${n}&before=${encodeURIComponent(n==='opens'?l.opened_at:l.clicked_at)}&before_id=${l.id}`);const d=await r.json();if(id!==detail.id)return;const rows=d[n];document.getElementById('tab-'+n).insertAdjacentHTML('beforeend',rows.map(n==='opens'?openHtml:clickHtml).join(''));if(rows.length)detail.last[n]=rows[rows.length-1];detail.more[n]=d['more_'+n]}finally{detail.loading=false}}
+function detailScroll(m){if(m.scrollTop+m.clientHeight>=m.scrollHeight-100)loadMore(document.querySelector('.tab-content.active').id.slice(4))}
 function switchTab(n,el){document.querySelectorAll('.tab').forEach(t=>t.classList.remove('active'));document.querySelectorAll('.tab-content').forEach(t=>t.classList.remove('active'));el.classList.add('active');document.getElementById('tab-'+n).classList.add('active')}
 function closeModal(e){if(e.target===document.getElementById('modalOverlay'))document.getElementById('modalOverlay').classList.remove('show')}
 async function deleteEmail(id){await fetch(`/api/emails/${id}`,{method:'DELETE'});loadEmails()}
 function copyText(id){navigator.clipboard.writeText(document.getElementById(id).textContent).then(()=>{const b=document.getElementById(id).parentElement.querySelector('.copy-btn');b.textContent='Copied!';setTimeout(()=>b.textContent='Copy',2000)})}
-function esc(s){const d=document.createElement('div');d.textContent=s;return d.innerHTML}
+const ESC_MAP={'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#x27;'};
+function esc(s){return String(s??'').replace(/[&<>"']/g,c=>ESC_MAP[c])}
 checkGmail();if(location.search.includes('gmail=connected'))history.replaceState({},'','/');loadEmails();setInterval(loadEmails,30000);
 </script>
 </body></html>
 """
 
+# The dashboard has no template variables, so it is encoded once and served as-is.
+DASHBOARD_BYTES = DASHBOARD_HTML.encode("utf-8")
+DASHBOARD_HEADERS = {
+    "Content-Type": "text/html; charset=utf-8",
+    "Content-Length": str(len(DASHBOARD_BYTES)),
+    "Cache-Control": "public, max-age=60",
+}
+
 init_db()
 
+flusher_thread = threading.Thread(target=event_flush_loop, daemon=True)
+flusher_thread.start()
+
+optimize_thread = threading.Thread(target=optimize_loop, daemon=True)
+optimize_thread.start()
+
 if GOOGLE_LIBS_AVAILABLE and GOOGLE_CLIENT_ID:
     monitor_thread = threading.Thread(target=gmail_monitor_loop, daemon=True)
     monitor_thread.start()